@@ -16,6 +16,9 @@ DB_NAME = 'on_ds_test'
 
 DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
 
+# Plain mysql:// URL for connectorx (no SQLAlchemy dialect prefix)
+CONNECTORX_URL = f"mysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
 # Trino Database Configuration
 TRINO_HOST = '192.168.0.163'
 TRINO_PORT = 8082
@@ -43,6 +46,11 @@ R10M_DATE_SQL = f"'{R10M_DATE.strftime('%Y-%m-%d')}'"
 REQUIRED_VERTICALS = ['running', 'training', 'outdoor', 'allday', 'tennis']
 TARGET_VERTICALS = ['tennis', 'running', 'outdoor', 'training', 'allday']
 
+# Shared categorical dtype for vertical columns, built once at import so
+# every frame (and every chunk, when processing in chunks) uses the same
+# category codes
+VERTICAL_DTYPE = pd.CategoricalDtype(REQUIRED_VERTICALS)
+
 # Vertical mapping dictionary
 VERTICAL_MAPPING = {
     'Performance All Day': 'allday',
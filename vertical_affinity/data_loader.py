@@ -1,25 +1,103 @@
 """
 Data loading functions for product, member, and employee tables.
 """
+from pathlib import Path
+import connectorx as cx
 import pandas as pd
-from vertical_affinity.config import PRODUCT_MYSQL, EMPLOYEE_MYSQL, MEMBER_MYSQL
+import pyarrow as pa
+from vertical_affinity.config import (
+    CONNECTORX_URL,
+    CURRENT_DATE,
+    PRODUCT_MYSQL,
+    EMPLOYEE_MYSQL,
+    MEMBER_MYSQL
+)
 
+# Local parquet cache for slowly-changing tables, keyed per day
+CACHE_DIR = Path('cache')
 
-def load_product_table(engine):
+ARROW_STRING = pd.ArrowDtype(pa.string())
+
+# Identifier columns used as join/groupby keys throughout the pipeline
+ID_COLUMNS = ('member_uid', 'account_id', 'product_name', 'model')
+
+
+def use_arrow_strings(df):
     """
-    Load product table from MySQL database.
-    
+    Convert known identifier columns to Arrow-backed string dtype.
+
+    Joins and groupbys on Arrow strings run on dictionary-encoded codes
+    instead of hashing Python str objects, and the columns take a
+    fraction of the memory.
+
+    Args:
+        df: DataFrame possibly containing identifier columns
+
+    Returns:
+        pd.DataFrame: Same frame with identifier columns converted
+    """
+    for col in ID_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(ARROW_STRING)
+    return df
+
+
+def read_with_cache(name, loader):
+    """
+    Read a dataframe through a daily local parquet cache.
+
+    The source tables change slowly, so reruns on the same day can skip
+    the network fetch entirely and read the columnar cache instead.
+
+    Args:
+        name: Cache key (typically the source table name)
+        loader: Zero-argument callable that fetches the dataframe
+
+    Returns:
+        pd.DataFrame: Cached or freshly loaded data
+    """
+    cache_path = CACHE_DIR / f"{name}_{CURRENT_DATE.strftime('%Y%m%d')}.parquet"
+    if cache_path.exists():
+        print(f"✅ 使用本地缓存: {cache_path}")
+        return use_arrow_strings(pd.read_parquet(cache_path, engine='pyarrow'))
+
+    df = loader()
+    CACHE_DIR.mkdir(exist_ok=True)
+    df.to_parquet(cache_path, engine='pyarrow', compression='zstd', index=False)
+    return df
+
+
+def _read_mysql_table(table_name):
+    """
+    Load a full MySQL table through connectorx.
+
+    connectorx streams the result into Arrow buffers in native code
+    instead of going row-by-row through the DB-API, which is much faster
+    and lighter on memory for full-table loads.
+
     Args:
-        engine: SQLAlchemy engine for MySQL connection
-        
+        table_name: Name of the MySQL table to load
+
+    Returns:
+        pd.DataFrame: Table contents
+    """
+    table = cx.read_sql(
+        CONNECTORX_URL,
+        f'SELECT * FROM {table_name}',
+        return_type='pandas'
+    )
+    return use_arrow_strings(table)
+
+
+def load_product_table():
+    """
+    Load product table from MySQL database.
+
     Returns:
         pd.DataFrame: Product data
     """
     try:
-        product = pd.read_sql_table(
-            table_name=PRODUCT_MYSQL,
-            con=engine
-        )
+        product = read_with_cache(PRODUCT_MYSQL, lambda: _read_mysql_table(PRODUCT_MYSQL))
         print(f"\n✅ 成功加载表 '{PRODUCT_MYSQL}'，共 {len(product)} 行。")
         return product
     except Exception as e:
@@ -27,21 +105,15 @@ def load_product_table(engine):
         raise
 
 
-def load_employee_table(engine):
+def load_employee_table():
     """
     Load employee table from MySQL database.
-    
-    Args:
-        engine: SQLAlchemy engine for MySQL connection
-        
+
     Returns:
         pd.DataFrame: Employee data
     """
     try:
-        employee = pd.read_sql_table(
-            table_name=EMPLOYEE_MYSQL,
-            con=engine
-        )
+        employee = read_with_cache(EMPLOYEE_MYSQL, lambda: _read_mysql_table(EMPLOYEE_MYSQL))
         print(f"\n✅ 成功加载表 '{EMPLOYEE_MYSQL}'，共 {len(employee)} 行。")
         return employee
     except Exception as e:
@@ -49,21 +121,15 @@ def load_employee_table(engine):
         raise
 
 
-def load_member_table(engine):
+def load_member_table():
     """
     Load member table from MySQL database.
-    
-    Args:
-        engine: SQLAlchemy engine for MySQL connection
-        
+
     Returns:
         pd.DataFrame: Member data
     """
     try:
-        member = pd.read_sql_table(
-            table_name=MEMBER_MYSQL,
-            con=engine
-        )
+        member = read_with_cache(MEMBER_MYSQL, lambda: _read_mysql_table(MEMBER_MYSQL))
         print(f"\n✅ 成功加载表 '{MEMBER_MYSQL}'，共 {len(member)} 行。")
         return member
     except Exception as e:
@@ -74,16 +140,20 @@ def load_member_table(engine):
 def filter_employees(member_df, employee_df):
     """
     Filter out employees from member dataframe.
-    
+
     Args:
         member_df: Member dataframe
         employee_df: Employee dataframe
-        
+
     Returns:
         pd.DataFrame: Filtered member data without employees
     """
-    employee_ids = employee_df['member_uid'].unique()
-    member_filtered = member_df[~member_df['member_uid'].isin(employee_ids)].copy()
+    # Categorical member_uid turns the isin lookup (and downstream merges)
+    # into integer-code comparisons instead of string hashing. isin dedupes
+    # its value set internally, so no .unique() pass is needed.
+    member_df['member_uid'] = member_df['member_uid'].astype('category')
+    mask = ~member_df['member_uid'].isin(employee_df['member_uid'])
+    # No defensive copy: downstream only reads from the filtered frame
+    member_filtered = member_df[mask]
     print(f"\n✅ 成功过滤员工，共 {len(member_filtered)} 行。")
     return member_filtered
-
@@ -2,48 +2,89 @@
 Digital behavior data processing: PDP views, Add to Cart, and Navigation.
 """
 import pandas as pd
+import numpy as np
+from vertical_affinity.data_loader import read_with_cache, use_arrow_strings
 from vertical_affinity.config import (
     R10M_DATE_SQL,
     R4M_DATE_SQL,
     CURRENT_DATE,
     VERTICAL_MAPPING,
+    VERTICAL_DTYPE,
     REQUIRED_VERTICALS,
     EVENT_PDP_VIEW,
-    EVENT_ADD_TO_CART,
-    BASE_COLUMNS
+    EVENT_ADD_TO_CART
 )
 
+# Rows fetched per round trip when streaming query results
+READ_CHUNKSIZE = 200_000
 
-def load_tracking_data(conn):
+EVENT_NAVI_CLICK = 'plp_category_navi_click'
+
+# Navigation category names as they appear in the tracking events
+NAVI_CATEGORY_MAPPING = {
+    '路跑': 'running',
+    '运动生活': 'allday',
+    '徒步越野': 'outdoor',
+    '网球': 'tennis',
+    '综训': 'training',
+}
+
+
+def _load_event_aggregates(conn):
     """
-    Load event tracking data from Trino.
-    
+    Load all event aggregates from Trino in a single table scan.
+
+    PDP views, add-to-cart and navigation clicks share the same date
+    range and account filter, so one scan of v_event_3 serves both
+    load_tracking_data and load_navigation_data. The count and latest
+    event time are computed server-side per (account_id, event_name,
+    product_name, cat_name); the daily parquet cache makes the second
+    caller read the already-fetched result instead of rescanning.
+
     Args:
         conn: Trino database connection
-        
+
     Returns:
-        pd.DataFrame: Event tracking data
+        pd.DataFrame: Aggregated event data for all consumed event types
     """
-    query = f'''SELECT 
-"#event_name" as event_name,
-"#event_time" as event_time,
+    query = f'''SELECT
 "#account_id" as account_id,
-"page_type",
-"#os" as os,
-"login_pt",
-"#mp_platform" as mp_platform,
-"current_status",
+"#event_name" as event_name,
 "product_name",
-"product_type",
-"search_term",
-"product_id"
+"cat_name",
+COUNT(*) as event_count,
+MAX("#event_time") as last_event_time
 FROM v_event_3
-where "#account_id" is not null 
+where "#account_id" is not null
 and "#event_time" > date({R10M_DATE_SQL}) and "#event_time" < date({R4M_DATE_SQL})
-and "#event_name" in ('add_to_cart','pdp_view','plp_category_navi_click','search')
+and ("#event_name" in ('add_to_cart','pdp_view')
+     or ("#event_name" = '{EVENT_NAVI_CLICK}' and cat_level > 2))
+GROUP BY 1, 2, 3, 4
 '''
-    event = pd.read_sql(query, conn)
-    print(f"Loaded {len(event)} event records")
+    def fetch():
+        # Stream the result in chunks so fetching overlaps with DataFrame
+        # construction instead of buffering the whole result set twice
+        chunks = pd.read_sql(query, conn, chunksize=READ_CHUNKSIZE)
+        return use_arrow_strings(pd.concat(chunks, ignore_index=True))
+
+    return read_with_cache('v_event_3_aggregates', fetch)
+
+
+def load_tracking_data(conn):
+    """
+    Load pre-aggregated PDP view and add-to-cart data from Trino.
+
+    Args:
+        conn: Trino database connection
+
+    Returns:
+        pd.DataFrame: Aggregated event tracking data
+    """
+    aggregates = _load_event_aggregates(conn)
+    event = aggregates[
+        aggregates['event_name'].isin([EVENT_PDP_VIEW, EVENT_ADD_TO_CART])
+    ].drop(columns=['cat_name'])
+    print(f"Loaded {len(event)} aggregated event rows")
     return event
 
 
@@ -58,19 +99,32 @@ def merge_product_vertical(event_df, product_df):
     Returns:
         pd.DataFrame: Merged dataframe with vertical information
     """
-    event_df['event_time'] = pd.to_datetime(event_df['event_time'])
-    
-    # Merge with product table
-    merged_df = event_df.merge(
+    # Project down to the columns the metrics actually consume before
+    # merging, and drop the join keys right after — the merge then
+    # allocates only for columns that flow downstream
+    event_slim = event_df[
+        ['account_id', 'event_name', 'event_count', 'last_event_time', 'product_name']
+    ]
+    merged_df = event_slim.merge(
         product_df[['model', 'vertical']],
         left_on='product_name',
         right_on='model',
         how='left'
+    ).drop(columns=['product_name', 'model'])
+
+    merged_df['last_event_time'] = pd.to_datetime(merged_df['last_event_time'])
+
+    # Apply vertical mapping via hashtable lookup (Series.replace drags in
+    # regex-aware replacement machinery for a plain dict remap); the shared
+    # categorical dtype makes the isin filter below an int-code comparison
+    # and keeps category codes identical across calls
+    merged_df['vertical'] = (
+        merged_df['vertical']
+        .map(VERTICAL_MAPPING)
+        .fillna(merged_df['vertical'])
+        .astype(VERTICAL_DTYPE)
     )
     
-    # Apply vertical mapping
-    merged_df['vertical'] = merged_df['vertical'].replace(VERTICAL_MAPPING)
-    
     # Filter to required verticals
     merged_df = merged_df[merged_df['vertical'].isin(REQUIRED_VERTICALS)]
     
@@ -85,35 +139,62 @@ def merge_product_vertical(event_df, product_df):
 def calculate_affinity_metrics(df, event_name, prefix):
     """
     Calculate affinity metrics for a specific event type.
-    
+
+    Works on the server-side aggregates from load_tracking_data: counts
+    are summed and last event times maxed up from per-product rows to
+    the (account_id, vertical) level.
+
     Args:
-        df: Merged event dataframe
+        df: Merged aggregated event dataframe
         event_name: Event name to filter (e.g., 'pdp_view', 'add_to_cart')
         prefix: Prefix for column names (e.g., 'PDP_View_', 'ATC_')
-        
+
     Returns:
         pd.DataFrame: Metrics dataframe with counts and days since last
     """
-    event_df = df[df['event_name'] == event_name].copy()
-    if event_df.empty:
+    event_mask = (df['event_name'] == event_name).to_numpy()
+    if not event_mask.any():
         return None
-    
-    # Optimized: Calculate both count and max time in a single groupby operation
-    grouped = event_df.groupby(BASE_COLUMNS).agg({
-        'event_time': ['count', 'max']
-    }).reset_index()
-    
-    # Flatten column names
-    grouped.columns = BASE_COLUMNS + [f'{prefix}6M_Count', 'Latest_Action_Time']
-    
-    # Calculate days since last
-    grouped[f'{prefix}Days_Since_Last'] = (
-        CURRENT_DATE - grouped['Latest_Action_Time']
-    ).dt.days
-    
-    # Drop intermediate column
-    final_metrics = grouped.drop(columns=['Latest_Action_Time'])
-    
+
+    account_ids = df['account_id'].to_numpy()[event_mask]
+    verticals = df['vertical'].to_numpy()[event_mask]
+    event_counts = df['event_count'].to_numpy()[event_mask]
+    # Normalize to nanoseconds before the i8 view — the column may come
+    # back as datetime64[us] (pd.to_datetime on newer pandas, parquet
+    # cache round-trips) and the day arithmetic below assumes ns
+    event_times = (
+        df['last_event_time'].to_numpy(dtype='datetime64[ns]')[event_mask].view('i8')
+    )
+
+    # Factorize both key columns once and combine into a single group
+    # code, so count and max each run as one numpy pass over the rows
+    # instead of two separate groupby reductions
+    account_codes, account_uniques = pd.factorize(account_ids)
+    vertical_codes, vertical_uniques = pd.factorize(verticals)
+    n_verticals = len(vertical_uniques)
+    group_codes = account_codes * n_verticals + vertical_codes
+    n_groups = len(account_uniques) * n_verticals
+
+    counts = np.bincount(
+        group_codes, weights=event_counts, minlength=n_groups
+    ).astype(np.int64)
+    latest_times = np.full(n_groups, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(latest_times, group_codes, event_times)
+
+    # Keep only (account_id, vertical) pairs that actually occurred
+    observed = counts > 0
+    group_idx = np.nonzero(observed)[0]
+
+    ns_per_day = 86_400_000_000_000
+    days_since_last = (CURRENT_DATE.value - latest_times[observed]) // ns_per_day
+
+    final_metrics = pd.DataFrame({
+        'account_id': account_uniques[group_idx // n_verticals],
+        'vertical': vertical_uniques[group_idx % n_verticals],
+        f'{prefix}6M_Count': counts[observed],
+        f'{prefix}Days_Since_Last': days_since_last
+    })
+
     return final_metrics
 
 
@@ -130,88 +211,103 @@ def process_pdp_atc(merged_df):
     # Calculate metrics for PDP and ATC
     pdp_result = calculate_affinity_metrics(merged_df, EVENT_PDP_VIEW, 'PDP_View_')
     atc_result = calculate_affinity_metrics(merged_df, EVENT_ADD_TO_CART, 'ATC_')
-    
-    # Merge intermediate results
-    intermediate_result = pd.merge(
-        pdp_result,
-        atc_result,
-        on=BASE_COLUMNS,
-        how='outer'
-    )
-    
-    # Fill missing values
-    intermediate_result = intermediate_result.fillna({
+
+    fill_values = {
         'PDP_View_6M_Count': 0,
         'PDP_View_Days_Since_Last': 9999,
         'ATC_6M_Count': 0,
         'ATC_Days_Since_Last': 9999
-    })
-    
-    # Create complete base table with all combinations
-    all_account_ids = merged_df['account_id'].unique()
-    all_combinations_df = pd.MultiIndex.from_product(
-        [all_account_ids, REQUIRED_VERTICALS],
-        names=BASE_COLUMNS
-    ).to_frame(index=False)
-    
-    base_result = pd.merge(
-        all_combinations_df,
-        intermediate_result,
-        on=BASE_COLUMNS,
-        how='left'
+    }
+
+    # Pivot each metric set straight to wide format; the (account_id,
+    # vertical) keys are already unique after the groupby
+    wide_pdp = pdp_result.pivot(
+        index='account_id',
+        columns='vertical',
+        values=['PDP_View_6M_Count', 'PDP_View_Days_Since_Last']
     )
-    
-    # Fill missing values again
-    base_result = base_result.fillna({
-        'PDP_View_6M_Count': 0,
-        'PDP_View_Days_Since_Last': 9999,
-        'ATC_6M_Count': 0,
-        'ATC_Days_Since_Last': 9999
-    })
-    
-    # Pivot to wide format
-    df_pivot = base_result.set_index(BASE_COLUMNS)
-    pdp_atc = df_pivot.unstack(level='vertical')
-    
+    wide_atc = atc_result.pivot(
+        index='account_id',
+        columns='vertical',
+        values=['ATC_6M_Count', 'ATC_Days_Since_Last']
+    )
+    pdp_atc = wide_pdp.join(wide_atc, how='outer')
+
+    # Reindex fills the holes the old cross-product base table existed
+    # for: every account from the event stream and every (metric,
+    # vertical) column, with per-metric fill values
+    pdp_atc = pdp_atc.reindex(
+        index=merged_df['account_id'].unique(),
+        columns=pd.MultiIndex.from_product(
+            [list(fill_values), REQUIRED_VERTICALS],
+            names=[None, 'vertical']
+        )
+    )
+
     # Flatten column names
     pdp_atc.columns = [
-        f'{col[0]}_{col[1]}' 
+        f'{col[0]}_{col[1]}'
         for col in pdp_atc.columns
     ]
-    
-    pdp_atc = pdp_atc.reset_index()
-    
+
+    pdp_atc = pdp_atc.fillna({
+        f'{metric}_{vertical}': fill
+        for metric, fill in fill_values.items()
+        for vertical in REQUIRED_VERTICALS
+    })
+
+    pdp_atc = pdp_atc.rename_axis('account_id').reset_index()
+
     expected_cols = 1 + 4 * len(REQUIRED_VERTICALS)
     print(f"✅ 最终列数检查: {len(pdp_atc.columns)} (预期: {expected_cols})")
-    
+
     return pdp_atc
 
 
 def load_navigation_data(conn):
     """
-    Load navigation category click data from Trino.
-    
+    Load navigation category click counts by vertical from Trino.
+
+    Reuses the fused event aggregates, so no extra table scan is issued
+    beyond the one load_tracking_data already triggered.
+
     Args:
         conn: Trino database connection
-        
+
     Returns:
         pd.DataFrame: Navigation data with counts by vertical
     """
-    query = f'''select "#account_id" as account_id, 
-sum(case when cat_name = '路跑' then 1 else 0 end) as navi_6M_count_running,
-sum(case when cat_name = '运动生活' then 1 else 0 end) as navi_6M_count_allday,
-sum(case when cat_name = '徒步越野' then 1 else 0 end) as navi_6M_count_outdoor,
-sum(case when cat_name = '网球' then 1 else 0 end) as navi_6M_count_tennis,
-sum(case when cat_name = '综训' then 1 else 0 end) as navi_6M_count_training
-FROM v_event_3 
-where "#account_id" is not null 
-and "#event_time" > date({R10M_DATE_SQL}) and "#event_time" < date({R4M_DATE_SQL})
-and "#event_name" in ('plp_category_navi_click')
-and cat_level > 2
-group by 1
-'''
-    navi_df = pd.read_sql(query, conn)
-    return navi_df
+    aggregates = _load_event_aggregates(conn)
+    navi = aggregates[aggregates['event_name'] == EVENT_NAVI_CLICK]
+
+    navi_df = (
+        navi.assign(vertical=navi['cat_name'].map(NAVI_CATEGORY_MAPPING))
+        .dropna(subset=['vertical'])
+        .pivot_table(
+            index='account_id',
+            columns='vertical',
+            values='event_count',
+            aggfunc='sum',
+            fill_value=0
+        )
+    )
+
+    # Accounts whose navi clicks all fall outside the mapped categories
+    # still get an all-zero row, as the old server-side query emitted —
+    # they count as having a touchpoint downstream
+    navi_df = navi_df.reindex(
+        pd.Index(navi['account_id'].unique(), name='account_id'), fill_value=0
+    )
+
+    navi_df.columns = [f'navi_6M_count_{col}' for col in navi_df.columns]
+
+    # Ensure all required verticals are present as columns
+    for vertical in REQUIRED_VERTICALS:
+        col_name = f'navi_6M_count_{vertical}'
+        if col_name not in navi_df.columns:
+            navi_df[col_name] = 0
+
+    return navi_df.reset_index()
 
 
 def merge_digital_features(pdp_atc_df, navi_df):
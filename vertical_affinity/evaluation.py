@@ -39,7 +39,10 @@ group by 1
 '''
     
     try:
-        validation = pd.read_sql(query, engine)
+        # Stream the result in chunks to avoid double-buffering the full
+        # result set (driver buffer + DataFrame) during the fetch
+        chunks = pd.read_sql(query, engine, chunksize=200_000)
+        validation = pd.concat(chunks, ignore_index=True)
         validation = validation.fillna(0)
         return validation
     except Exception as e:
@@ -47,77 +50,14 @@ group by 1
         raise
 
 
-def compare_vertical_performance(df, vertical_name):
-    """
-    Compare predicted vs non-predicted groups for a specific vertical.
-    
-    Args:
-        df: Dataframe with predictions and validation data
-        vertical_name: Vertical name to compare
-        
-    Returns:
-        dict: Comparison metrics
-    """
-    purchase_col = f'{vertical_name}_purchase'
-    sales_share_col = f'{vertical_name}_sales_share'
-    
-    if purchase_col not in df.columns or sales_share_col not in df.columns:
-        print(f"错误：DataFrame 缺少 {purchase_col} 或 {sales_share_col} 列，跳过 {vertical_name}。")
-        return None
-    
-    # Split groups
-    group_predicted = df[df['Predicted_Vertical'] == vertical_name]
-    group_not_predicted = df[df['Predicted_Vertical'] != vertical_name]
-    
-    # Calculate metrics
-    cvr_predicted = (
-        (group_predicted[purchase_col] > 0).sum() / len(group_predicted) 
-        if len(group_predicted) > 0 else 0
-    )
-    cvr_not_predicted = (
-        (group_not_predicted[purchase_col] > 0).sum() / len(group_not_predicted) 
-        if len(group_not_predicted) > 0 else 0
-    )
-    
-    avg_purchase_predicted = (
-        group_predicted[purchase_col].mean() 
-        if len(group_predicted) > 0 else 0
-    )
-    avg_purchase_not_predicted = (
-        group_not_predicted[purchase_col].mean() 
-        if len(group_not_predicted) > 0 else 0
-    )
-    
-    avg_sales_share_predicted = (
-        group_predicted[sales_share_col].mean() 
-        if len(group_predicted) > 0 else 0
-    )
-    avg_sales_share_not_predicted = (
-        group_not_predicted[sales_share_col].mean() 
-        if len(group_not_predicted) > 0 else 0
-    )
-    
-    results = {
-        'Vertical': vertical_name,
-        'Predicted_Group_Size': len(group_predicted),
-        'Not_Predicted_Group_Size': len(group_not_predicted),
-        'CVR_Predicted': cvr_predicted,
-        'CVR_Not_Predicted': cvr_not_predicted,
-        'CVR_Ratio': cvr_predicted / cvr_not_predicted if cvr_not_predicted > 0 else np.nan,
-        'Avg_Purchase_Predicted': avg_purchase_predicted,
-        'Avg_Purchase_Not_Predicted': avg_purchase_not_predicted,
-        'Purchase_Ratio': (
-            avg_purchase_predicted / avg_purchase_not_predicted 
-            if avg_purchase_not_predicted > 0 else np.nan
-        ),
-        'Avg_Sales_Share_Predicted': avg_sales_share_predicted,
-        'Avg_Sales_Share_Not_Predicted': avg_sales_share_not_predicted,
-        'Sales_Share_Ratio': (
-            avg_sales_share_predicted / avg_sales_share_not_predicted 
-            if avg_sales_share_not_predicted > 0 else np.nan
-        ),
-    }
-    return results
+def _safe_ratio(numerator, denominator):
+    """Return numerator / denominator, or NaN when the denominator is 0."""
+    return numerator / denominator if denominator > 0 else np.nan
+
+
+def _group_mean(total, size):
+    """Return total / size, or 0 for an empty group."""
+    return total / size if size > 0 else 0
 
 
 def evaluate_model(df_scored, validation_df):
@@ -140,14 +80,82 @@ def evaluate_model(df_scored, validation_df):
         ['member_uid', 'Predicted_Vertical'] + affinity_score_cols
     ].merge(validation_df, on='member_uid', how='left')
     val = val.fillna(0)
-    
-    # Compare all verticals
+
+    # One groupby pass over the merged frame replaces the former
+    # per-vertical filtering (2 full scans per vertical): sum purchases,
+    # sales shares and buyer flags by predicted vertical, then derive
+    # each "not predicted" side as totals minus the predicted group
+    purchase_cols = [f'{v}_purchase' for v in TARGET_VERTICALS]
+    share_cols = [f'{v}_sales_share' for v in TARGET_VERTICALS]
+    missing = [
+        col for col in purchase_cols + share_cols if col not in val.columns
+    ]
+    if missing:
+        print(f"错误：DataFrame 缺少列: {missing}")
+
+    # Aggregate only the columns actually present, so a missing vertical
+    # is skipped below instead of raising KeyError here
+    present_purchase = [col for col in purchase_cols if col not in missing]
+    present_share = [col for col in share_cols if col not in missing]
+
+    buyer_flags = (val[present_purchase] > 0).add_suffix('_any')
+    group_sums = pd.concat(
+        [val[['Predicted_Vertical']], val[present_purchase + present_share], buyer_flags],
+        axis=1
+    ).groupby('Predicted_Vertical').sum()
+    group_sizes = val['Predicted_Vertical'].value_counts()
+    total_sums = group_sums.sum(axis=0)
+    total_n = len(val)
+
     comparison_results = []
     for vertical in TARGET_VERTICALS:
-        result = compare_vertical_performance(val, vertical)
-        if result:
-            comparison_results.append(result)
-    
+        purchase_col = f'{vertical}_purchase'
+        share_col = f'{vertical}_sales_share'
+        if purchase_col in missing or share_col in missing:
+            print(f"错误：跳过 {vertical}。")
+            continue
+
+        n_predicted = int(group_sizes.get(vertical, 0))
+        n_not_predicted = total_n - n_predicted
+
+        if vertical in group_sums.index:
+            predicted = group_sums.loc[vertical]
+        else:
+            predicted = total_sums * 0
+
+        cvr_predicted = _group_mean(predicted[f'{purchase_col}_any'], n_predicted)
+        cvr_not_predicted = _group_mean(
+            total_sums[f'{purchase_col}_any'] - predicted[f'{purchase_col}_any'],
+            n_not_predicted
+        )
+        avg_purchase_predicted = _group_mean(predicted[purchase_col], n_predicted)
+        avg_purchase_not_predicted = _group_mean(
+            total_sums[purchase_col] - predicted[purchase_col], n_not_predicted
+        )
+        avg_sales_share_predicted = _group_mean(predicted[share_col], n_predicted)
+        avg_sales_share_not_predicted = _group_mean(
+            total_sums[share_col] - predicted[share_col], n_not_predicted
+        )
+
+        comparison_results.append({
+            'Vertical': vertical,
+            'Predicted_Group_Size': n_predicted,
+            'Not_Predicted_Group_Size': n_not_predicted,
+            'CVR_Predicted': cvr_predicted,
+            'CVR_Not_Predicted': cvr_not_predicted,
+            'CVR_Ratio': _safe_ratio(cvr_predicted, cvr_not_predicted),
+            'Avg_Purchase_Predicted': avg_purchase_predicted,
+            'Avg_Purchase_Not_Predicted': avg_purchase_not_predicted,
+            'Purchase_Ratio': _safe_ratio(
+                avg_purchase_predicted, avg_purchase_not_predicted
+            ),
+            'Avg_Sales_Share_Predicted': avg_sales_share_predicted,
+            'Avg_Sales_Share_Not_Predicted': avg_sales_share_not_predicted,
+            'Sales_Share_Ratio': _safe_ratio(
+                avg_sales_share_predicted, avg_sales_share_not_predicted
+            ),
+        })
+
     df_comparison = pd.DataFrame(comparison_results)
     
     print("\n--- ✅ Affinity Score 预测效果验证结果 ---")
@@ -1,6 +1,9 @@
 """
 Main entry point for vertical affinity analysis pipeline.
 """
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 from vertical_affinity.database import create_mysql_engine, create_trino_connection
 from vertical_affinity.data_loader import (
@@ -18,7 +21,6 @@ from vertical_affinity.digital_behavior import (
 )
 from vertical_affinity.community_activity import (
     load_activity_data,
-    categorize_activities,
     process_activity_features
 )
 from vertical_affinity.rfm_calculator import (
@@ -36,9 +38,14 @@ from vertical_affinity.evaluation import load_validation_data, evaluate_model
 from vertical_affinity.monitoring import run_feature_distribution_checks
 
 
-def main():
+def main(run_monitoring=False):
     """
     Main pipeline execution function.
+
+    Args:
+        run_monitoring: Whether to run the full feature distribution
+            checks. Off by default — they are diagnostics only and cost
+            two full-table aggregation passes.
     """
     print("=" * 60)
     print("Vertical Affinity Analysis Pipeline")
@@ -51,9 +58,9 @@ def main():
     
     # ======================== LOAD BASE TABLES ========================
     print("\n[2/10] Loading base tables...")
-    product_df = load_product_table(engine)
-    employee_df = load_employee_table(engine)
-    member_df = load_member_table(engine)
+    product_df = load_product_table()
+    employee_df = load_employee_table()
+    member_df = load_member_table()
     member_filtered = filter_employees(member_df, employee_df)
     
     # ======================== DIGITAL BEHAVIOR ========================
@@ -67,12 +74,11 @@ def main():
     # ======================== COMMUNITY ACTIVITY ========================
     print("\n[4/10] Processing community activity data...")
     activity_df = load_activity_data(engine)
-    activity_df = categorize_activities(activity_df)
     activity_features = process_activity_features(activity_df)
     
     # ======================== RFM BY VERTICAL ========================
     print("\n[5/10] Calculating RFM metrics by vertical...")
-    rfm_df = calculate_rfm_by_vertical(engine)
+    rfm_df = calculate_rfm_by_vertical()
     rfm_features = process_rfm_features(rfm_df)
     
     # ======================== MERGE ALL FEATURES ========================
@@ -94,23 +100,43 @@ def main():
     print("\n[9/10] Calculating affinity scores and assigning verticals...")
     scored_df, scored_columns = assign_predicted_vertical(normalized_df)
     
+    pred_counts = scored_df['Predicted_Vertical'].value_counts(dropna=False)
     print("\n--- 预测品类分布 ---")
-    print(scored_df['Predicted_Vertical'].value_counts())
+    print(pred_counts)
 
     # ======================== FEATURE DISTRIBUTION CHECKS ========================
-    print("\n[9.5/10] Running feature distribution checks...")
-    run_feature_distribution_checks(
-        member_filtered,
-        all_features_df,
-        filtered_df,
-        normalized_df,
-        scored_df
-    )
-    
-    # ======================== EVALUATION ========================
-    print("\n[10/10] Evaluating model performance...")
-    validation_df = load_validation_data(engine)
-    comparison_df, validation_merged = evaluate_model(scored_df, validation_df)
+    # The monitoring checks are a pure diagnostic pass and feed nothing
+    # downstream: opt-in via --monitoring, and when enabled they run in
+    # a worker process while the evaluation SQL load and merge proceed
+    # on the main process. The cheap counts (members, touchpoints,
+    # prediction distribution) are printed above in every run.
+    if run_monitoring:
+        print("\n[9.5/10] Running feature distribution checks (in background)...")
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            monitoring_future = executor.submit(
+                run_feature_distribution_checks,
+                member_filtered,
+                all_features_df,
+                filtered_df,
+                normalized_df,
+                scored_df,
+                pred_counts=pred_counts
+            )
+
+            # ======================== EVALUATION ========================
+            print("\n[10/10] Evaluating model performance...")
+            validation_df = load_validation_data(engine)
+            comparison_df, validation_merged = evaluate_model(scored_df, validation_df)
+
+            # Surface any exception raised by the monitoring checks
+            monitoring_future.result()
+    else:
+        print("\n[9.5/10] Skipping feature distribution checks (use --monitoring to enable)...")
+
+        # ======================== EVALUATION ========================
+        print("\n[10/10] Evaluating model performance...")
+        validation_df = load_validation_data(engine)
+        comparison_df, validation_merged = evaluate_model(scored_df, validation_df)
     
     # ======================== SUMMARY ========================
     print("\n" + "=" * 60)
@@ -123,5 +149,12 @@ def main():
 
 
 if __name__ == "__main__":
-    scored_df, comparison_df = main()
+    parser = argparse.ArgumentParser(description="Vertical affinity analysis pipeline")
+    parser.add_argument(
+        '--monitoring',
+        action='store_true',
+        help='Run the full feature distribution checks (diagnostics only)'
+    )
+    args = parser.parse_args()
+    scored_df, comparison_df = main(run_monitoring=args.monitoring)
 